@@ -1,15 +1,36 @@
-from fastapi import APIRouter, HTTPException, Body
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+
+from fastapi import APIRouter, HTTPException, Body, Depends, Request
 from pydantic import BaseModel, Field
 from typing import Dict, Any, Optional, List
 
-from app.models.sentiment import SentimentAnalyzer
-from app.utils.preprocessing import preprocess_text
+from app.models.batching import DynamicBatcher
+from app.models.sentiment import SentimentAnalyzer, TextTooLongError
+from app.utils.preprocessing import preprocess_text, clean_review_batch
 
 # Initialize router
 router = APIRouter()
 
-# Initialize sentiment analyzer
-sentiment_analyzer = SentimentAnalyzer()
+# The sentiment analyzer, its executor and the batcher are created once in the app's lifespan (see app/main.py)
+def get_sentiment_analyzer(request: Request) -> SentimentAnalyzer:
+    return request.app.state.analyzer
+
+def get_model_executor(request: Request) -> Executor:
+    return request.app.state.model_executor
+
+def get_batcher(request: Request) -> DynamicBatcher:
+    return request.app.state.batcher
+
+# Number of reviews per chunk when /analyze/batch overlaps preprocessing with inference;
+# a multiple of the analyzer's bucket size so length bucketing still has texts to group
+PIPELINE_CHUNK_SIZE = 32
+
+async def _preprocess_chunk(reviews):
+    """Preprocess the texts of a chunk of batch reviews in a worker thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, clean_review_batch, [review.text for review in reviews])
 
 # Define request/response models
 class ReviewRequest(BaseModel):
@@ -37,7 +58,8 @@ class BatchSentimentResponse(BaseModel):
 
 @router.post("/analyze", response_model=SentimentResponse, 
              summary="Analyze review sentiment")
-async def analyze_sentiment(review: ReviewRequest = Body(...)):
+async def analyze_sentiment(review: ReviewRequest = Body(...),
+                            batcher: DynamicBatcher = Depends(get_batcher)):
     """
     Analyze the sentiment of a customer review.
     
@@ -56,34 +78,21 @@ async def analyze_sentiment(review: ReviewRequest = Body(...)):
     If truncate=false and text exceeds the model's token limit, returns 400 Bad Request.
     """
     try:
-        # Check if text might exceed token limit (rough estimation)
-        # 250 words is a conservative estimation to stay under 512 tokens
-        words = review.text.split()
-        was_truncated = len(words) > 250
-        
-        # If text is too long and truncation is disabled, return error
-        if was_truncated and not review.truncate:
-            raise HTTPException(
-                status_code=400, 
-                detail="Text exceeds model's token limit (>250 words / ~512 tokens) and truncation is disabled"
-            )
-        
         # Preprocess the text
         processed_text = preprocess_text(review.text)
         
-        # Truncate if necessary and enabled
-        if was_truncated and review.truncate:
-            processed_text = " ".join(processed_text.split()[:500])
+        # Analyze sentiment; concurrent requests are merged into one model call by the batcher.
+        # If truncation is disabled and the text exceeds the model's token limit, return error
+        try:
+            analysis_results = await batcher.process((processed_text, review.truncate))
+        except TextTooLongError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Analyze sentiment
-        analysis_results = sentiment_analyzer.analyze(processed_text)
-        
-        # Create response
-        response = SentimentResponse(
+        # Create response; the results come from our own analyzer, so skip re-validating them
+        response = SentimentResponse.model_construct(
             **analysis_results,
             review_id=review.review_id,
-            source=review.source,
-            truncated=was_truncated and review.truncate
+            source=review.source
         )
         
         return response
@@ -94,7 +103,9 @@ async def analyze_sentiment(review: ReviewRequest = Body(...)):
 
 @router.post("/analyze/batch", response_model=BatchSentimentResponse, 
             summary="Analyze multiple reviews in batch")
-async def analyze_batch(request: BatchReviewRequest = Body(...)):
+async def analyze_batch(request: BatchReviewRequest = Body(...),
+                        sentiment_analyzer: SentimentAnalyzer = Depends(get_sentiment_analyzer),
+                        model_executor: Executor = Depends(get_model_executor)):
     """
     Analyze the sentiment of multiple customer reviews in batch.
     
@@ -107,52 +118,60 @@ async def analyze_batch(request: BatchReviewRequest = Body(...)):
     If any review exceeds the token limit and has truncation disabled, a 400 error is returned.
     """
     try:
-        results = []
-        
         for review in request.reviews:
             # Use global truncate setting if not specified in individual review
             if not hasattr(review, 'truncate'):
                 review.truncate = request.truncate
+        
+        # Process the reviews in chunks, preprocessing the next chunk while the model runs on the current one
+        chunks = [
+            request.reviews[start:start + PIPELINE_CHUNK_SIZE]
+            for start in range(0, len(request.reviews), PIPELINE_CHUNK_SIZE)
+        ]
+        loop = asyncio.get_running_loop()
+        
+        results = []
+        next_texts = asyncio.create_task(_preprocess_chunk(chunks[0]))
+        try:
+            for index, chunk in enumerate(chunks):
+                processed_texts = await next_texts
+                if index + 1 < len(chunks):
+                    next_texts = asyncio.create_task(_preprocess_chunk(chunks[index + 1]))
                 
-            # Check if text might exceed token limit (rough estimation)
-            # 250 words is a conservative estimation to stay under 512 tokens
-            words = review.text.split()
-            was_truncated = len(words) > 250
-            
-            # If text is too long and truncation is disabled, return error
-            if was_truncated and not review.truncate:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Review {review.review_id} exceeds model's token limit (>250 words / ~512 tokens) and truncation is disabled"
-                )
-            
-            # Preprocess the text first
-            processed_text = preprocess_text(review.text)
-            
-            # Truncate if necessary and enabled
-            if was_truncated and review.truncate:
-                # More conservative truncation - aim for ~250 words which should be under 512 tokens
-                processed_text = " ".join(processed_text.split()[:250])
+                # Analyze the chunk with a single batched model call, off the event loop.
+                # If a review exceeds the token limit and has truncation disabled, return error
+                try:
+                    chunk_results = await loop.run_in_executor(
+                        model_executor,
+                        partial(
+                            sentiment_analyzer.analyze_batch,
+                            processed_texts,
+                            truncate=[review.truncate for review in chunk],
+                        ),
+                    )
+                except TextTooLongError as e:
+                    raise HTTPException(
+                        status_code=400, 
+                        detail=f"Review {chunk[e.index].review_id} exceeds model's token limit ({e.max_length} tokens) and truncation is disabled"
+                    )
                 
-            # Check if still too long after preprocessing (safety check)
-            if len(processed_text.split()) > 250 and not review.truncate:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Text is too long after preprocessing and truncation is disabled"
+                # The results come from our own analyzer, so skip re-validating them
+                results.extend(
+                    SentimentResponse.model_construct(
+                        **analysis_results,
+                        review_id=review.review_id,
+                        source=review.source
+                    )
+                    for review, analysis_results in zip(chunk, chunk_results)
                 )
-            
-            # Analyze sentiment
-            analysis_results = sentiment_analyzer.analyze(processed_text)
-            
-            # Create response item
-            results.append(SentimentResponse(
-                **analysis_results,
-                review_id=review.review_id,
-                source=review.source,
-                truncated=was_truncated and review.truncate
-            ))
+        finally:
+            # Don't leave the next chunk's preprocessing running if this request failed
+            next_texts.cancel()
+            if next_texts.done() and not next_texts.cancelled():
+                # Retrieve a failure that is no longer needed so asyncio doesn't log it as unhandled
+                next_texts.exception()
         
-        return BatchSentimentResponse(results=results)
+        return BatchSentimentResponse.model_construct(results=results)
     except HTTPException:
         raise  # Re-raise HTTP exceptions
     except Exception as e:
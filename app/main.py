@@ -1,13 +1,65 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+# Keep the tokenizer's thread pool from competing with torch's threads and from warning (or deadlocking)
+# when uvicorn forks worker processes. Must be set before transformers is imported.
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.endpoints import router as api_router
+from app.models.batching import DynamicBatcher
+from app.models.sentiment import SentimentAnalyzer
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Load the sentiment model once per process and start the dynamic batcher
+    that merges concurrent /analyze requests into batched model calls.
+    """
+    # Loading also runs a warmup inference, so the first request does not pay for it
+    logger.info("Loading sentiment analysis model")
+    app.state.analyzer = SentimentAnalyzer()
+    logger.info("Sentiment analysis model loaded")
+    
+    # A single thread owns the model, so blocking inference never runs on the event loop
+    # and model calls from the batcher and the batch endpoint are serialized
+    app.state.model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentiment-model")
+    
+    analyzer = app.state.analyzer
+    
+    def analyze_requests(requests):
+        """Analyze (text, truncate) pairs; a rejected text fails only its own request."""
+        texts, truncate = zip(*requests)
+        return analyzer.analyze_batch(list(texts), truncate=list(truncate), return_exceptions=True)
+    
+    app.state.batcher = DynamicBatcher(
+        analyze_requests,
+        max_batch_size=16,
+        max_delay=0.05,
+        executor=app.state.model_executor,
+    )
+    await app.state.batcher.start()
+    yield
+    await app.state.batcher.stop()
+    app.state.model_executor.shutdown(wait=True)
+    del app.state.batcher
+    del app.state.model_executor
+    del app.state.analyzer
 
 # Create FastAPI app
+# No custom default_response_class (e.g. ORJSONResponse): endpoints with a response_model are
+# serialized straight to JSON bytes by Pydantic's Rust serializer, which a custom class would bypass
 app = FastAPI(
     title="Review Sentiment Analysis API",
     description="API for analyzing sentiment in customer reviews",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -0,0 +1,104 @@
+import asyncio
+
+class DynamicBatcher:
+    def __init__(self, infer_fn, max_batch_size=16, max_delay=0.05, executor=None):
+        """
+        Merge concurrent single-item requests into batched model calls.
+        
+        Args:
+            infer_fn (callable): Function taking a list of inputs and returning a list of outputs;
+                an output that is an exception instance is raised in its request only
+            max_batch_size (int): Maximum number of inputs merged into one call
+            max_delay (float): Maximum time in seconds to wait for a batch to fill up
+            executor (concurrent.futures.Executor): Executor infer_fn runs in (default: the loop's default executor)
+        """
+        self.infer_fn = infer_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.executor = executor
+        self._queue = None
+        self._worker = None
+    
+    async def start(self):
+        """Start the background task that consumes and processes batches."""
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the background task, failing any requests still waiting."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+        self._worker = None
+    
+    async def process(self, item):
+        """
+        Submit a single input and wait for its result.
+        
+        Args:
+            item: Input passed to infer_fn as part of a batch
+            
+        Returns:
+            The output of infer_fn corresponding to item
+        """
+        if self._worker is None:
+            raise RuntimeError("DynamicBatcher has not been started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+    
+    async def _collect_batch(self):
+        """Wait for one request, then gather more until the batch is full or max_delay passes."""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run(self):
+        """Process batches until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            
+            # Drop requests whose client has gone away before spending compute on them
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            
+            items = [item for item, _ in batch]
+            try:
+                # Run the blocking model call in a worker thread so the event loop keeps accepting requests
+                outputs = await loop.run_in_executor(self.executor, self.infer_fn, items)
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), output in zip(batch, outputs):
+                if future.done():
+                    continue
+                if isinstance(output, BaseException):
+                    future.set_exception(output)
+                else:
+                    future.set_result(output)
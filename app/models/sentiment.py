@@ -1,16 +1,156 @@
-from transformers import pipeline
+import contextlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+# Texts used to warm the model up at startup. torch.compile specializes dimensions of size 1 even
+# with dynamic=True, so a single text and a batch of several texts compile to separate graphs;
+# the warmup runs both shapes (see _warmup) so neither compiles on the request path.
+WARMUP_TEXTS = [
+    "warmup",
+    "another warmup text",
+]
+
+class TextTooLongError(ValueError):
+    """Raised when a text exceeds the model's token limit and truncation is disabled for it."""
+    
+    def __init__(self, index, max_length):
+        super().__init__(f"Text exceeds model's token limit ({max_length} tokens) and truncation is disabled")
+        self.index = index  # Position of the text in the analyzed batch
+        self.max_length = max_length
 
 class SentimentAnalyzer:
-    def __init__(self):
+    def __init__(self, bucket_size=16, quantize=True, compile_model=True, cpu_bf16=False, cache_size=2048,
+                 num_threads=None):
         """
         Initialize the sentiment analyzer with a pre-trained model.
         Uses DistilBERT model fine-tuned for sentiment analysis.
+        
+        Args:
+            bucket_size (int): Maximum number of similar-length texts run through the model together
+            quantize (bool): Whether to apply INT8 dynamic quantization to the model's linear layers
+            compile_model (bool): Whether to compile the model with torch.compile at startup
+            cpu_bf16 (bool): Whether to run CPU inference under bfloat16 autocast instead of
+                INT8 quantization; only worth it on CPUs with native bf16 support (e.g. AMX)
+            cache_size (int): Maximum number of results kept in the LRU cache of analyzed texts
+            num_threads (int): Number of threads torch uses for CPU inference; defaults to
+                OMP_NUM_THREADS if set, otherwise to the number of CPUs available to the process
         """
-        # Load pre-trained model for sentiment analysis
-        self.sentiment_pipeline = pipeline(
-            "sentiment-analysis",
-            model="distilbert-base-uncased-finetuned-sst-2-english",
-        )
+        self.bucket_size = bucket_size
+        
+        self._configure_threads(num_threads)
+        
+        # Maximum number of tokens (including special tokens) the model accepts; longer texts are truncated
+        self.max_length = 512
+        
+        # Recently analyzed texts, so repeated reviews skip the model entirely
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+        # Use the GPU when available; half precision halves the memory traffic for weights and activations
+        use_cuda = torch.cuda.is_available()
+        self.device = torch.device("cuda" if use_cuda else "cpu")
+        
+        # Load pre-trained model for sentiment analysis; the tokenizer and model are called
+        # directly rather than through a transformers pipeline to avoid its per-call overhead
+        model_name = "distilbert-base-uncased-finetuned-sst-2-english"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(
+            model_name,
+            torch_dtype=torch.float16 if use_cuda else torch.float32,
+        ).to(self.device)
+        self.model.eval()
+        
+        # Label names in the order of the model's output logits
+        id2label = self.model.config.id2label
+        self.labels = [id2label[i] for i in range(len(id2label))]
+        
+        # INT8 dynamic quantization is CPU-only and does not combine with bf16 autocast
+        self.bf16_autocast = cpu_bf16 and not use_cuda
+        self.quantized = quantize and not use_cuda and not self.bf16_autocast
+        
+        if self.quantized:
+            # Linear layers dominate DistilBERT's CPU latency; run them as int8 GEMMs
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        
+        # The uncompiled model, kept while a compiled one is in use so inference can fall back to it
+        self._eager_model = None
+        
+        if compile_model and hasattr(torch, "compile"):
+            self._compile_model()
+        else:
+            self._warmup()
+    
+    @staticmethod
+    def _configure_threads(num_threads):
+        """Set torch's intra-op thread count and use a single inter-op thread."""
+        if num_threads is None and "OMP_NUM_THREADS" not in os.environ:
+            num_threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        
+        # Requests are served one model call at a time, so inter-op parallelism only adds overhead
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Can only be set once per process, before any inter-op parallel work has started
+            pass
+    
+    def _compile_model(self):
+        """
+        Replace the eager model with a torch.compile'd one, falling back to eager mode
+        if compilation is not supported on this platform.
+        """
+        self._eager_model = self.model
+        # Batch sizes and review lengths vary per request, so compile for dynamic shapes to avoid recompiling
+        self.model = torch.compile(self._eager_model, dynamic=True)
+        try:
+            # Compilation happens lazily on the first call, so pay for it now rather than on the first request
+            self._warmup()
+        except Exception:
+            logger.warning("torch.compile failed, falling back to eager mode", exc_info=True)
+            self.model = self._eager_model
+            self._eager_model = None
+            self._warmup()
+    
+    def _warmup(self):
+        """Run inference so lazy initialization and compilation do not slow down the first requests."""
+        # Bypass the result cache so the model is actually run. A bucket of one text (e.g. a lone
+        # /analyze request) and a bucket of several texts need separate graphs, so warm up both
+        self._infer(self._encode(WARMUP_TEXTS[:1]))
+        self._infer(self._encode(WARMUP_TEXTS))
+    
+    def _forward(self, inputs):
+        """
+        Run the model on tokenized inputs and return the logits.
+        
+        If the compiled model fails (e.g. while recompiling for an unseen input shape),
+        switch to the eager model for good rather than failing the request.
+        """
+        try:
+            return self.model(**inputs).logits
+        except Exception:
+            if self._eager_model is None:
+                raise
+            logger.warning("Compiled model failed, falling back to eager mode", exc_info=True)
+            self.model = self._eager_model
+            self._eager_model = None
+            return self.model(**inputs).logits
+    
+    def _autocast(self):
+        """Return the autocast context inference should run under."""
+        if self.bf16_autocast:
+            return torch.autocast("cpu", dtype=torch.bfloat16)
+        return contextlib.nullcontext()
     
     def analyze(self, text):
         """
@@ -22,33 +162,165 @@ class SentimentAnalyzer:
         Returns:
             dict: Dictionary containing sentiment analysis results
         """
-        # Handle long texts - transformer models typically have a 512 token limit
-        # If text is too long, truncate it to approximately 250 words as sometimes we can already get a good sense of sentiment
-        # This is a simple approach - in production, we might want more sophisticated chunking
-        words = text.split()
-        if len(words) > 250:  # More conservative truncation
-            text = " ".join(words[:250])
+        return self.analyze_batch([text])[0]
+    
+    def analyze_batch(self, texts, truncate=True, return_exceptions=False):
+        """
+        Analyze the sentiment of several texts with a single batched model call.
+        
+        Args:
+            texts (list): List of texts to analyze
+            truncate (bool or list): Whether texts over the model's token limit may be truncated;
+                either one setting for all texts or one per text
+            return_exceptions (bool): If True, texts rejected for exceeding the token limit get a
+                TextTooLongError in their place in the returned list instead of it being raised
+            
+        Returns:
+            list: List of sentiment analysis result dicts, in the same order as texts
+            
+        Raises:
+            TextTooLongError: If a text exceeds the token limit and truncation is disabled for it
+                (unless return_exceptions is True); raised before the model is run
+        """
+        if isinstance(truncate, bool):
+            truncate = [truncate] * len(texts)
+        
+        results = [self._cache_get(text) for text in texts]
+        
+        # Tokenize each distinct uncached text once; the encodings are reused for inference
+        missing = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+        encodings = dict(zip(missing, self._encode(missing))) if missing else {}
+        
+        # Reject texts over the token limit whose truncation is disabled, before running the model
+        for i, (text, result, allowed) in enumerate(zip(texts, results, truncate)):
+            too_long = result["truncated"] if result is not None else encodings[text][1]
+            if too_long and not allowed:
+                error = TextTooLongError(i, self.max_length)
+                if not return_exceptions:
+                    raise error
+                results[i] = error
+        
+        # Only run the model on texts that are not cached or rejected, each distinct text once
+        needed = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+        if needed:
+            computed = dict(zip(needed, self._infer([encodings[text] for text in needed])))
+            self._cache_put(computed)
+            results = [
+                result if result is not None else self._copy_result(computed[text])
+                for text, result in zip(texts, results)
+            ]
+        
+        return results
+    
+    def _encode(self, texts):
+        """
+        Tokenize texts, truncating them to the model's token limit.
+        
+        Args:
+            texts (list): List of texts
+            
+        Returns:
+            list: (input_ids, truncated) for each text, where truncated tells whether
+                the text was longer than the token limit
+        """
+        # Overflowing tokens come back as extra rows mapped to their text, so truncation is
+        # detected in the same tokenizer call instead of tokenizing the full text separately
+        encoded = self.tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.max_length,
+            return_overflowing_tokens=True,
+        )
+        encodings = [None] * len(texts)
+        for input_ids, i in zip(encoded["input_ids"], encoded["overflow_to_sample_mapping"]):
+            if encodings[i] is None:
+                encodings[i] = (input_ids, False)
+            else:
+                encodings[i] = (encodings[i][0], True)
+        return encodings
+    
+    def _infer(self, encodings):
+        """
+        Run the model on tokenized texts, bucketed by token length.
+        
+        Args:
+            encodings (list): (input_ids, truncated) for each text, as returned by _encode
+            
+        Returns:
+            list: List of sentiment analysis result dicts, in the same order as encodings
+        """
+        # Sort texts by token length and split them into buckets of similar length, so each
+        # bucket is only padded to its own longest text instead of the longest text overall
+        order = sorted(range(len(encodings)), key=lambda i: len(encodings[i][0]))
         
-        # Get raw sentiment analysis results
-        result = self.sentiment_pipeline(text)[0]
+        results = [None] * len(encodings)
+        for start in range(0, len(order), self.bucket_size):
+            bucket = order[start:start + self.bucket_size]
+            inputs = self._pad([encodings[i][0] for i in bucket])
+            # inference_mode skips autograd bookkeeping entirely (cheaper than no_grad)
+            with torch.inference_mode(), self._autocast():
+                probabilities = self._forward(inputs).float().softmax(dim=-1).tolist()
+            
+            # Put results back in the original order of the texts
+            for i, scores in zip(bucket, probabilities):
+                results[i] = self._format_result(dict(zip(self.labels, scores)))
+                results[i]["truncated"] = encodings[i][1]
         
-        # Extract label and score
-        label = result['label']
-        score = result['score']
+        return results
+    
+    def _pad(self, batch_ids):
+        """Right-pad token ids to the longest sequence and build the model inputs."""
+        longest = max(len(ids) for ids in batch_ids)
+        input_ids = torch.full((len(batch_ids), longest), self.tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch_ids), longest), dtype=torch.long)
+        for row, ids in enumerate(batch_ids):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+        return {
+            "input_ids": input_ids.to(self.device),
+            "attention_mask": attention_mask.to(self.device),
+        }
+    
+    def _cache_get(self, text):
+        """Return a copy of the cached result for text, or None if it is not cached."""
+        with self._cache_lock:
+            result = self._cache.get(text)
+            if result is None:
+                return None
+            self._cache.move_to_end(text)
+        return self._copy_result(result)
+    
+    def _cache_put(self, results):
+        """Add results (a dict of text to result) to the cache, evicting the least recently used."""
+        with self._cache_lock:
+            for text, result in results.items():
+                self._cache[text] = result
+                self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    @staticmethod
+    def _copy_result(result):
+        """Copy a result so callers cannot modify cached entries."""
+        return {**result, "detailed_scores": dict(result["detailed_scores"])}
+    
+    @staticmethod
+    def _format_result(detailed_scores):
+        """Convert the model's probability for every label into the service's response format."""
+        # The predicted label is the most probable one
+        label = max(detailed_scores, key=detailed_scores.get)
+        score = detailed_scores[label]
         
         # Convert to positive/negative format
-        sentiment = "positive" if label == "POSITIVE" else "negative"
+        sentiment = label.lower()
         
         # Create normalized score between -1 and 1
         # Where 1 is very positive and -1 is very negative
-        normalized_score = score if sentiment == "positive" else -score
+        normalized_score = detailed_scores.get("POSITIVE", 0.0) - detailed_scores.get("NEGATIVE", 0.0)
         
         return {
             "sentiment": sentiment,
             "confidence": score,
             "normalized_score": normalized_score,
-            "detailed_scores": {
-                "POSITIVE": score if sentiment == "positive" else 1 - score,
-                "NEGATIVE": score if sentiment == "negative" else 1 - score
-            }
-        }
\ No newline at end of file
+            "detailed_scores": detailed_scores
+        }
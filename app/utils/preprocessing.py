@@ -1,5 +1,15 @@
 import re
+from functools import lru_cache
 
+# HTML tags, URLs and special characters are removed in a single pass over the text;
+# only punctuation that might be relevant for sentiment is kept
+_CLEANUP = re.compile(r'<.*?>|https?://\S+|www\.\S+|[^\w\s.,!?]')
+_WS = re.compile(r'\s+')
+
+# Translation table deleting the ASCII characters _CLEANUP treats as special characters
+_ASCII_SPECIAL = {c: None for c in range(128) if _CLEANUP.fullmatch(chr(c))}
+
+@lru_cache(maxsize=4096)
 def preprocess_text(text):
     """
     Perform basic text preprocessing on review text.
@@ -10,22 +20,21 @@ def preprocess_text(text):
     Returns:
         str: Preprocessed text ready for sentiment analysis
     """
-    # Convert to lowercase
-    text = text.lower()
+    if not text:
+        return text
     
-    # Remove HTML tags if present (for website reviews)
-    text = re.sub(r'<.*?>', '', text)
+    text = text.lower()
     
-    # Remove URLs
-    text = re.sub(r'https?://\S+|www\.\S+', '', text)
+    # Fast path: plain ASCII text without HTML or URLs only needs special characters removed,
+    # which str.translate does much faster than the regex engine
+    if text.isascii() and '<' not in text and '://' not in text and 'www.' not in text:
+        return ' '.join(text.translate(_ASCII_SPECIAL).split())
     
-    # Remove special characters but keep punctuation that might be relevant for sentiment
-    text = re.sub(r'[^\w\s.,!?]', '', text)
+    # Remove HTML tags (for website reviews), URLs and special characters
+    text = _CLEANUP.sub('', text)
     
     # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text
+    return _WS.sub(' ', text).strip()
 
 def clean_review_batch(reviews):
     """
@@ -37,4 +46,4 @@ def clean_review_batch(reviews):
     Returns:
         list: List of preprocessed review texts
     """
-    return [preprocess_text(review) for review in reviews]
\ No newline at end of file
+    return list(map(preprocess_text, reviews))
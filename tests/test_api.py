@@ -7,17 +7,21 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.main import app
+from app.api.endpoints import PIPELINE_CHUNK_SIZE
 
-# Create test client
-client = TestClient(app)
+# Create test client; entering it runs the app's startup/shutdown lifespan
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
 
-def test_health_check():
+def test_health_check(client):
     """Test the health check endpoint"""
     response = client.get("/api/v1/health")
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
 
-def test_root_endpoint():
+def test_root_endpoint(client):
     """Test the root endpoint"""
     response = client.get("/")
     assert response.status_code == 200
@@ -26,7 +30,7 @@ def test_root_endpoint():
     assert "version" in data
     assert "docs_url" in data
 
-def test_analyze_positive_sentiment():
+def test_analyze_positive_sentiment(client):
     """Test sentiment analysis with positive text"""
     review = {
         "text": "This product is amazing! I absolutely love it.",
@@ -44,7 +48,7 @@ def test_analyze_positive_sentiment():
     assert "POSITIVE" in result["detailed_scores"]
     assert "NEGATIVE" in result["detailed_scores"]
 
-def test_analyze_negative_sentiment():
+def test_analyze_negative_sentiment(client):
     """Test sentiment analysis with negative text"""
     review = {
         "text": "This is terrible. I regret buying this product.",
@@ -60,7 +64,7 @@ def test_analyze_negative_sentiment():
     assert result["review_id"] == "test456"
     assert result["source"] == "app"
 
-def test_analyze_neutral_text():
+def test_analyze_neutral_text(client):
     """Test sentiment analysis with more neutral text"""
     review = {
         "text": "The product arrived on time. It's what I ordered.",
@@ -73,7 +77,7 @@ def test_analyze_neutral_text():
     assert "confidence" in result
     assert -1 <= result["normalized_score"] <= 1
 
-def test_analyze_with_html():
+def test_analyze_with_html(client):
     """Test sentiment analysis with HTML in the text"""
     review = {
         "text": "<div>This product is <strong>fantastic</strong>!</div>",
@@ -85,7 +89,7 @@ def test_analyze_with_html():
     assert result["sentiment"] == "positive"
     assert result["confidence"] > 0.5
 
-def test_batch_with_mixed_truncation():
+def test_batch_with_mixed_truncation(client):
     """Test batch processing with some reviews requiring truncation"""
     batch_request = {
         "reviews": [
@@ -126,7 +130,7 @@ def test_batch_with_mixed_truncation():
     assert results[2]["sentiment"] == "negative"
     assert results[2]["truncated"] == False
 
-def test_empty_text():
+def test_empty_text(client):
     """Test error handling with empty text"""
     review = {
         "text": "",
@@ -136,7 +140,7 @@ def test_empty_text():
     response = client.post("/api/v1/analyze", json=review)
     assert response.status_code == 422  # Validation error
 
-def test_missing_text():
+def test_missing_text(client):
     """Test error handling with missing text field"""
     review = {
         "review_id": "test999",
@@ -145,7 +149,7 @@ def test_missing_text():
     response = client.post("/api/v1/analyze", json=review)
     assert response.status_code == 422  # Validation error
 
-def test_invalid_batch():
+def test_invalid_batch(client):
     """Test error handling with empty batch"""
     batch_request = {
         "reviews": []
@@ -153,7 +157,7 @@ def test_invalid_batch():
     response = client.post("/api/v1/analyze/batch", json=batch_request)
     assert response.status_code == 422  # Validation error
 
-def test_large_text_with_truncation():
+def test_large_text_with_truncation(client):
     """Test with a very large text input that exceeds model's token limit, with truncation enabled"""
     # Generate a long text (approximately 1000 words)
     long_text = "This product is great. " * 200
@@ -173,7 +177,7 @@ def test_large_text_with_truncation():
     assert result["truncated"] == True  # Should indicate truncation happened
     assert result["confidence"] > 0.5
 
-def test_large_text_without_truncation():
+def test_large_text_without_truncation(client):
     """Test with a very large text input that exceeds model's token limit, with truncation disabled"""
     # Generate a long text (approximately 1000 words)
     long_text = "This product is great. " * 200
@@ -190,4 +194,39 @@ def test_large_text_without_truncation():
     
     # Check the error message
     error_detail = response.json()["detail"]
-    assert "too long" in error_detail or "exceeds" in error_detail
\ No newline at end of file
+    assert "too long" in error_detail or "exceeds" in error_detail
+
+def test_batch_spanning_multiple_chunks(client):
+    """Test that results keep their order when a batch is processed in several chunks"""
+    texts = ["Great product, very satisfied!", "Disappointed with the quality."]
+    batch_request = {
+        "reviews": [
+            {"text": texts[i % 2], "review_id": f"chunk{i}"}
+            for i in range(PIPELINE_CHUNK_SIZE * 2 + 5)
+        ]
+    }
+    
+    response = client.post("/api/v1/analyze/batch", json=batch_request)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    
+    assert [r["review_id"] for r in results] == [r["review_id"] for r in batch_request["reviews"]]
+    assert [r["sentiment"] for r in results] == [
+        "positive" if i % 2 == 0 else "negative" for i in range(len(results))
+    ]
+
+def test_batch_rejects_long_text_in_later_chunk(client):
+    """Test that an over-long review with truncation disabled in a later chunk returns 400"""
+    reviews = [
+        {"text": "Great product, very satisfied!", "review_id": f"ok{i}"}
+        for i in range(PIPELINE_CHUNK_SIZE + 5)
+    ]
+    reviews[PIPELINE_CHUNK_SIZE + 2] = {
+        "text": "This product is great. " * 200,
+        "review_id": "too_long",
+        "truncate": False
+    }
+    
+    response = client.post("/api/v1/analyze/batch", json={"reviews": reviews})
+    assert response.status_code == 400
+    assert "too_long" in response.json()["detail"]
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.batching import DynamicBatcher
+
+def run_with_batcher(infer_fn, coro_fn, **kwargs):
+    """Start a batcher, run coro_fn against it and stop it again"""
+    async def main():
+        batcher = DynamicBatcher(infer_fn, **kwargs)
+        await batcher.start()
+        try:
+            return await coro_fn(batcher)
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+def test_concurrent_requests_are_merged():
+    """Test that concurrent requests share a model call and get their own results back"""
+    calls = []
+    
+    def infer(items):
+        calls.append(list(items))
+        return [item.upper() for item in items]
+    
+    async def submit(batcher):
+        return await asyncio.gather(*(batcher.process(text) for text in ["a", "b", "c"]))
+    
+    results = run_with_batcher(infer, submit, max_batch_size=16, max_delay=0.05)
+    
+    assert results == ["A", "B", "C"]
+    assert calls == [["a", "b", "c"]]
+
+def test_max_batch_size_is_respected():
+    """Test that batches never exceed max_batch_size"""
+    calls = []
+    
+    def infer(items):
+        calls.append(len(items))
+        return items
+    
+    async def submit(batcher):
+        return await asyncio.gather(*(batcher.process(i) for i in range(5)))
+    
+    results = run_with_batcher(infer, submit, max_batch_size=2, max_delay=0.05)
+    
+    assert results == list(range(5))
+    assert max(calls) <= 2
+    assert sum(calls) == 5
+
+def test_inference_runs_in_given_executor():
+    """Test that model calls run in the executor passed to the batcher, off the event loop"""
+    threads = []
+    
+    def infer(items):
+        threads.append(threading.current_thread().name)
+        return items
+    
+    async def submit(batcher):
+        return await batcher.process("text")
+    
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="model") as executor:
+        assert run_with_batcher(infer, submit, executor=executor) == "text"
+    
+    assert threads[0].startswith("model")
+
+def test_exception_outputs_fail_only_their_request():
+    """Test that an exception returned for one input is raised in that request only"""
+    def infer(items):
+        return [ValueError(item) if item == "bad" else item for item in items]
+    
+    async def submit(batcher):
+        return await asyncio.gather(batcher.process("good"), batcher.process("bad"), return_exceptions=True)
+    
+    good, bad = run_with_batcher(infer, submit)
+    
+    assert good == "good"
+    assert isinstance(bad, ValueError)
+
+def test_errors_are_propagated():
+    """Test that a failing model call raises in every waiting request"""
+    def infer(items):
+        raise ValueError("model failure")
+    
+    async def submit(batcher):
+        return await batcher.process("text")
+    
+    with pytest.raises(ValueError):
+        run_with_batcher(infer, submit)
@@ -27,6 +27,13 @@ def test_basic_functionality():
     # Test punctuation preservation
     assert preprocess_text("This has, some. punctuation!") == "this has, some. punctuation!"
 
+def test_ascii_fast_path_matches_full_cleanup():
+    """Test that plain ASCII text is cleaned the same way with and without HTML/URLs present"""
+    assert preprocess_text("") == ""
+    assert preprocess_text("  Don't   @me -- it's *GREAT*!  ") == "dont me its great!"
+    assert preprocess_text("<b>Don't</b> @me -- it's *GREAT*!") == "dont me its great!"
+    assert preprocess_text("Café's #1 pick!") == "cafés 1 pick!"
+
 def test_batch_processing():
     """Test batch processing of multiple reviews"""
     reviews = [
@@ -80,5 +87,14 @@ def test_real_world_examples():
         # Verify text isn't empty after processing
         assert len(p) > 0
 
+def test_repeated_text_is_cached():
+    """Test that preprocessing the same text twice hits the cache"""
+    text = "A review that shows up <b>twice</b>"
+    first = preprocess_text(text)
+    hits = preprocess_text.cache_info().hits
+    
+    assert preprocess_text(text) == first
+    assert preprocess_text.cache_info().hits == hits + 1
+
 if __name__ == "__main__":
     pytest.main(["-xvs", __file__])
\ No newline at end of file
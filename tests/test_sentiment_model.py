@@ -1,11 +1,12 @@
 import pytest
 import sys
 import os
+import torch
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.models.sentiment import SentimentAnalyzer
+from app.models.sentiment import SentimentAnalyzer, TextTooLongError
 
 # Initialize model once for all tests to avoid reloading for each test
 @pytest.fixture(scope="module")
@@ -68,4 +69,148 @@ def test_output_format(analyzer):
     assert 0 <= result["confidence"] <= 1
     
     # Normalized score should be between -1 and 1
-    assert -1 <= result["normalized_score"] <= 1
\ No newline at end of file
+    assert -1 <= result["normalized_score"] <= 1
+    
+    # Detailed scores are the model's class probabilities
+    scores = result["detailed_scores"]
+    assert sum(scores.values()) == pytest.approx(1.0, abs=1e-3)
+    assert result["confidence"] == max(scores.values())
+    assert result["normalized_score"] == pytest.approx(scores["POSITIVE"] - scores["NEGATIVE"])
+
+def test_quantized_model(analyzer):
+    """Test that linear layers are quantized and labels still match expectations"""
+    if not analyzer.quantized:
+        pytest.skip("INT8 quantization is only applied on CPU")
+    
+    modules = analyzer.model.modules()
+    assert not any(type(module) is torch.nn.Linear for module in modules)
+    
+    assert analyzer.analyze("This product is amazing! I love it so much.")["sentiment"] == "positive"
+    assert analyzer.analyze("Terrible experience. I regret buying this product.")["sentiment"] == "negative"
+
+def test_bf16_autocast_model():
+    """Test that CPU bf16 autocast replaces quantization and labels still match expectations"""
+    if torch.cuda.is_available():
+        pytest.skip("bf16 autocast is only used on CPU")
+    
+    bf16_analyzer = SentimentAnalyzer(cpu_bf16=True, compile_model=False)
+    assert bf16_analyzer.bf16_autocast is True
+    assert bf16_analyzer.quantized is False
+    
+    assert bf16_analyzer.analyze("This product is amazing! I love it so much.")["sentiment"] == "positive"
+    assert bf16_analyzer.analyze("Terrible experience. I regret buying this product.")["sentiment"] == "negative"
+
+def test_no_recompile_after_warmup(analyzer):
+    """Test that single-text and multi-text calls reuse the graphs compiled during warmup"""
+    if analyzer._eager_model is None:
+        pytest.skip("torch.compile is not in use on this platform")
+    from torch._dynamo.utils import counters
+    
+    graphs = counters["stats"]["unique_graphs"]
+    
+    # Call _infer directly so the result cache does not hide the model call
+    analyzer._infer(analyzer._encode(["A single text whose length differs from the warmup texts."]))
+    analyzer._infer(analyzer._encode([
+        "Two texts,",
+        "padded to yet another sequence length than the warmup batch used.",
+    ]))
+    
+    assert counters["stats"]["unique_graphs"] == graphs
+
+def test_compiled_model_failure_falls_back_to_eager(analyzer, monkeypatch):
+    """Test that a failing compiled model is replaced by the eager one instead of failing inference"""
+    eager_model = analyzer.model
+    
+    def broken_model(**inputs):
+        raise RuntimeError("recompilation failed")
+    monkeypatch.setattr(analyzer, "_eager_model", eager_model)
+    monkeypatch.setattr(analyzer, "model", broken_model)
+    
+    # Call _infer directly so the result cache does not hide the model call
+    results = analyzer._infer(analyzer._encode(["This product is amazing! I love it so much.", "Awful, it broke."]))
+    
+    assert [r["sentiment"] for r in results] == ["positive", "negative"]
+    assert analyzer.model is eager_model
+    assert analyzer._eager_model is None
+
+def test_analyze_batch_matches_single(analyzer):
+    """Test that batched analysis returns one result per text, in input order"""
+    texts = [
+        "This product is amazing! I love it so much.",
+        "Terrible experience. I regret buying this product.",
+        "Great customer service, very helpful and responsive.",
+    ]
+    results = analyzer.analyze_batch(texts)
+    
+    assert len(results) == len(texts)
+    assert [r["sentiment"] for r in results] == ["positive", "negative", "positive"]
+    for text, result in zip(texts, results):
+        assert result["sentiment"] == analyzer.analyze(text)["sentiment"]
+
+def test_analyze_batch_restores_order_across_buckets(analyzer, monkeypatch):
+    """Test that length bucketing does not reorder results"""
+    monkeypatch.setattr(analyzer, "bucket_size", 2)
+    texts = [
+        "This product is great. " * 40,
+        "Awful.",
+        "I love it.",
+        "The customer support was unhelpful and rude. " * 10,
+        "Poor quality, broke after one week. Waste of money.",
+    ]
+    results = analyzer.analyze_batch(texts)
+    
+    assert [r["sentiment"] for r in results] == ["positive", "negative", "positive", "negative", "negative"]
+
+def test_repeated_text_is_cached(analyzer, monkeypatch):
+    """Test that analyzing a text again is served from the cache without running the model"""
+    text = "Fast shipping and the item works perfectly."
+    first = analyzer.analyze(text)
+    
+    def fail(texts):
+        raise AssertionError("model should not be called for cached texts")
+    monkeypatch.setattr(analyzer, "_infer", fail)
+    
+    assert analyzer.analyze(text) == first
+    assert analyzer.analyze_batch([text, text]) == [first, first]
+
+def test_long_text_is_truncated(analyzer, monkeypatch):
+    """Test that texts over the model's token limit are flagged as truncated, tokenizing each text once"""
+    short_text = "Truncation check: this product is great."
+    long_text = "Truncation check: this product is great. " * 200
+    
+    tokenizer = analyzer.tokenizer
+    calls = []
+    
+    class CountingTokenizer:
+        def __call__(self, texts, **kwargs):
+            calls.append(list(texts))
+            return tokenizer(texts, **kwargs)
+        
+        def __getattr__(self, name):
+            return getattr(tokenizer, name)
+    monkeypatch.setattr(analyzer, "tokenizer", CountingTokenizer())
+    
+    short_result, long_result = analyzer.analyze_batch([short_text, long_text])
+    
+    assert calls == [[short_text, long_text]]
+    assert short_result["truncated"] == False
+    assert long_result["truncated"] == True
+    assert long_result["sentiment"] == "positive"
+
+def test_long_text_without_truncation_is_rejected(analyzer):
+    """Test that over-long texts with truncation disabled are rejected, alone or per text"""
+    short_text = "Rejection check: this product is great."
+    long_text = "Rejection check: this product is great. " * 200
+    
+    with pytest.raises(TextTooLongError) as excinfo:
+        analyzer.analyze_batch([short_text, long_text], truncate=False)
+    assert excinfo.value.index == 1
+    
+    # Truncation can be allowed per text
+    results = analyzer.analyze_batch([short_text, long_text], truncate=[False, True])
+    assert results[1]["truncated"] == True
+    
+    # With return_exceptions, only the rejected text fails
+    short_result, long_result = analyzer.analyze_batch([short_text, long_text], truncate=False, return_exceptions=True)
+    assert short_result["sentiment"] == "positive"
+    assert isinstance(long_result, TextTooLongError)